@@ -7,6 +7,12 @@ from pathlib import Path
 # Ollama Configuration
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 DEFAULT_MODEL = "llama3.2"
+MAX_CONTEXT_MESSAGES = 20  # 20 messages = 10 conversation turns
+
+# LLM backend: "ollama" or "vllm" (any OpenAI-compatible server with continuous batching)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "ollama").lower()
+VLLM_BASE_URL = os.getenv("VLLM_BASE_URL", "http://localhost:8000/v1")
+VLLM_API_KEY = os.getenv("VLLM_API_KEY", "none")
 
 # Directories
 CONVERSATIONS_DIR = Path("conversations")
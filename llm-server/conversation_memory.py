@@ -1,18 +1,52 @@
 """
 Simple SQLite-based conversation memory for storing message history.
 """
+import asyncio
+import logging
 import sqlite3
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Tuple, Optional
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
 
+logger = logging.getLogger(__name__)
+
 # Database path
 DB_PATH = Path(__file__).parent / "conversations.db"
 
+# One connection per thread, opened lazily and reused across calls
+_local = threading.local()
+
+# Materialized history per session (session_id -> (last row id, messages, complete)), in LRU order
+MAX_CACHED_SESSIONS = 256
+_history_cache: "OrderedDict[str, Tuple[int, List[BaseMessage], bool]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Write-behind queue of (session_id, messages, done event), drained by one background task
+SAVE_BATCH_SIZE = 32
+SAVE_BATCH_WINDOW_S = 0.05
+_save_queue: Optional[asyncio.Queue] = None
+_writer_task: Optional[asyncio.Task] = None
+# Event of each session's most recently queued save; writes land in FIFO order,
+# so once it is set every earlier save for that session has been written too
+_pending_saves: Dict[str, asyncio.Event] = {}
+
+
+def _get_connection() -> sqlite3.Connection:
+    """Return this thread's SQLite connection, opening it in WAL mode on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    return conn
+
 
 def init_db():
     """Initialize the database with required tables."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = _get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -31,39 +65,68 @@ def init_db():
     """)
     
     conn.commit()
-    conn.close()
 
 
-def load_conversation_history(session_id: str) -> List[BaseMessage]:
+def load_conversation_history(session_id: str, limit: Optional[int] = None) -> List[BaseMessage]:
     """
     Load conversation history for a session.
     
+    Only rows added since the last load are fetched; earlier messages come
+    from the in-memory cache.
+    
     Args:
         session_id: The session identifier
+        limit: If set, only the most recent `limit` messages are loaded and kept
         
     Returns:
         List of LangChain message objects
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    with _cache_lock:
+        last_id, messages, complete = _history_cache.get(session_id, (0, [], True))
     
-    cursor.execute("""
-        SELECT role, content FROM messages
-        WHERE session_id = ?
-        ORDER BY timestamp ASC
-    """, (session_id,))
+    conn = _get_connection()
+    if not complete and (limit is None or limit > len(messages)):
+        # Cached tail was trimmed by an earlier, smaller load; reload from the database
+        last_id, messages, complete = 0, [], True
     
-    rows = cursor.fetchall()
-    conn.close()
+    if last_id == 0 and limit is not None:
+        # Cold load: let SQLite pick the tail instead of materializing everything
+        rows = conn.execute("""
+            SELECT id, role, content FROM messages
+            WHERE session_id = ?
+            ORDER BY id DESC
+            LIMIT ?
+        """, (session_id, limit)).fetchall()
+        rows.reverse()
+        complete = len(rows) < limit
+    else:
+        rows = conn.execute("""
+            SELECT id, role, content FROM messages
+            WHERE session_id = ? AND id > ?
+            ORDER BY id ASC
+        """, (session_id, last_id)).fetchall()
     
-    messages = []
-    for role, content in rows:
-        if role == "human":
-            messages.append(HumanMessage(content=content))
-        elif role == "ai":
-            messages.append(AIMessage(content=content))
+    if rows:
+        new_messages = []
+        for _, role, content in rows:
+            if role == "human":
+                new_messages.append(HumanMessage(content=content))
+            elif role == "ai":
+                new_messages.append(AIMessage(content=content))
+        messages = messages + new_messages
+        last_id = rows[-1][0]
     
-    return messages
+    if limit is not None and len(messages) > limit:
+        messages = messages[-limit:]
+        complete = False
+    
+    with _cache_lock:
+        _history_cache[session_id] = (last_id, messages, complete)
+        _history_cache.move_to_end(session_id)
+        while len(_history_cache) > MAX_CACHED_SESSIONS:
+            _history_cache.popitem(last=False)
+    
+    return list(messages)
 
 
 def save_messages(session_id: str, messages: List[BaseMessage]):
@@ -74,18 +137,81 @@ def save_messages(session_id: str, messages: List[BaseMessage]):
         session_id: The session identifier
         messages: List of messages to save (typically the new human and AI messages)
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    for message in messages:
-        role = "human" if isinstance(message, HumanMessage) else "ai"
-        cursor.execute("""
+    _insert_rows(_to_rows(session_id, messages))
+
+
+def _to_rows(session_id: str, messages: List[BaseMessage]) -> List[Tuple[str, str, str]]:
+    return [
+        (session_id, "human" if isinstance(message, HumanMessage) else "ai", message.content)
+        for message in messages
+    ]
+
+
+def _insert_rows(rows: List[Tuple[str, str, str]]):
+    # Single transaction for the whole batch
+    with _get_connection() as conn:
+        conn.executemany("""
             INSERT INTO messages (session_id, role, content)
             VALUES (?, ?, ?)
-        """, (session_id, role, message.content))
+        """, rows)
+
+
+async def queue_save(session_id: str, messages: List[BaseMessage]):
+    """
+    Queue messages to be saved by the background writer and return immediately.
     
-    conn.commit()
-    conn.close()
+    Args:
+        session_id: The session identifier
+        messages: List of messages to save
+    """
+    global _save_queue, _writer_task
+    if _writer_task is None or _writer_task.done():
+        _save_queue = asyncio.Queue()
+        _writer_task = asyncio.create_task(_writer_loop(_save_queue))
+    done = asyncio.Event()
+    _pending_saves[session_id] = done
+    _save_queue.put_nowait((session_id, messages, done))
+
+
+async def wait_for_session_saves(session_id: str):
+    """Wait until this session's queued saves have been written; other sessions' writes are not awaited."""
+    done = _pending_saves.get(session_id)
+    if done is not None:
+        await done.wait()
+
+
+async def flush_pending_saves():
+    """Wait until every queued save has been written to the database."""
+    if _save_queue is not None:
+        await _save_queue.join()
+
+
+async def _writer_loop(queue: asyncio.Queue):
+    """Drain the save queue, writing up to SAVE_BATCH_SIZE entries per transaction."""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + SAVE_BATCH_WINDOW_S
+        while len(batch) < SAVE_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        
+        try:
+            rows = [row for session_id, messages, _ in batch for row in _to_rows(session_id, messages)]
+            await asyncio.to_thread(_insert_rows, rows)
+        except Exception as e:
+            logger.error(f"Error saving {len(batch)} queued message batches: {e}", exc_info=True)
+        finally:
+            for session_id, _, done in batch:
+                done.set()
+                if _pending_saves.get(session_id) is done:
+                    del _pending_saves[session_id]
+                queue.task_done()
 
 
 def clear_conversation(session_id: str):
@@ -95,13 +221,11 @@ def clear_conversation(session_id: str):
     Args:
         session_id: The session identifier
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    with _get_connection() as conn:
+        conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
     
-    cursor.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
-    
-    conn.commit()
-    conn.close()
+    with _cache_lock:
+        _history_cache.pop(session_id, None)
 
 
 # Initialize database on module import
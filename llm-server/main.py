@@ -3,6 +3,7 @@ LLM Server - Ollama Chat API with Memory
 Main entry point for the FastAPI application
 """
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
@@ -16,13 +17,21 @@ from routes import (
     chat_stream_endpoint,
     fast_stt_endpoint
 )
+from conversation_memory import flush_pending_saves
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Manage application lifecycle"""
+    yield
+    # Shutdown: make sure queued conversation writes reach the database
+    await flush_pending_saves()
+
 # Create FastAPI app
-app = FastAPI(title="LLM Server - Ollama Chat API with Memory")
+app = FastAPI(title="LLM Server - Ollama Chat API with Memory", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
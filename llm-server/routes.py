@@ -1,23 +1,27 @@
 """
 FastAPI routes for LLM server
 """
-import json
+import io
+import orjson
+import time
 import uuid
 import logging
-from datetime import datetime
 from fastapi import HTTPException, UploadFile, File, Form
 from fastapi.responses import StreamingResponse
 from langchain_core.messages import HumanMessage, AIMessage
 
 from models import ChatRequest, SessionResponse
-from session_manager import sessions, delete_session_file
-from workflow import get_workflow
-from conversation_memory import load_conversation_history, save_messages
-from config import DEFAULT_MODEL
-from stt_fast import transcribe_audio_bytes
+from session_manager import sessions, delete_session_file, new_session, serialize_messages
+from workflow import get_workflow, get_llm, get_system_message
+from conversation_memory import load_conversation_history, queue_save, wait_for_session_saves
+from config import DEFAULT_MODEL, MAX_CONTEXT_MESSAGES
+from stt_fast import transcribe_audio_bytes_async, MAX_AUDIO_BYTES
 
 logger = logging.getLogger(__name__)
 
+# Read size when copying STT uploads into memory
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
 
 def get_root():
     """Root endpoint with server info"""
@@ -32,13 +36,7 @@ def get_root():
 def create_session_endpoint(language: str = "en") -> SessionResponse:
     """Create a new conversation session"""
     session_id = str(uuid.uuid4())
-    session_data = {
-        "created_at": datetime.now().isoformat(),
-        "language": language,
-        "message_count": 0,
-        "messages": [],  # Store conversation history
-    }
-    sessions[session_id] = session_data
+    sessions[session_id] = new_session(language)
     
     logger.info(f"Created new session: {session_id}")
     return SessionResponse(
@@ -67,10 +65,11 @@ def get_session_messages_endpoint(session_id: str):
         raise HTTPException(status_code=404, detail="Session not found")
     
     session = sessions[session_id]
+    messages = session.get("messages", [])
     return {
         "session_id": session_id,
-        "message_count": len(session.get("messages", [])),
-        "messages": session.get("messages", [])
+        "message_count": len(messages),
+        "messages": serialize_messages(messages)
     }
 
 
@@ -89,6 +88,7 @@ async def fast_stt_endpoint(
     file: UploadFile = File(...),
     language: str | None = Form(None),
     task: str = Form("transcribe"),
+    include_tokens: bool = Form(False),
 ):
     """High-speed speech-to-text using faster-whisper.
 
@@ -96,14 +96,23 @@ async def fast_stt_endpoint(
     Parameters:
       language: optional language code (e.g. 'en'); if omitted model auto-detects.
       task: 'transcribe' (default) or 'translate'.
+      include_tokens: include per-segment token ids (off by default).
     """
     try:
         if file is None:
             raise HTTPException(status_code=400, detail="No file provided")
-        data = await file.read()
-        if not data:
+        # Copy the upload in bounded chunks so oversized files are rejected early
+        buffer = io.BytesIO()
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            buffer.write(chunk)
+            if buffer.tell() > MAX_AUDIO_BYTES:
+                raise HTTPException(status_code=413, detail="Audio file too large")
+        if not buffer.tell():
             raise HTTPException(status_code=400, detail="Empty file")
-        result = transcribe_audio_bytes(data, language=language, task=task)
+        buffer.seek(0)
+        result = await transcribe_audio_bytes_async(
+            buffer, language=language, task=task, include_tokens=include_tokens
+        )
         return {
             "text": result["text"],
             "language": result["language"],
@@ -126,13 +135,7 @@ async def chat_stream_endpoint(request: ChatRequest):
     session_id = request.session_id or str(uuid.uuid4())
     
     if session_id not in sessions:
-        session_data = {
-            "created_at": datetime.now().isoformat(),
-            "language": request.language,
-            "message_count": 0,
-            "messages": [],  # Store conversation history
-        }
-        sessions[session_id] = session_data
+        sessions[session_id] = new_session(request.language)
         logger.info(f"Created new session: {session_id}")
     
     logger.info(f"Chat request - Session: {session_id}, Language: {request.language}, Model: {request.model}, Messages: {len(request.messages)}")
@@ -141,58 +144,45 @@ async def chat_stream_endpoint(request: ChatRequest):
     model = request.model or DEFAULT_MODEL
     app = get_workflow(model, request.language)
     
-    # Load conversation history from database
-    conversation_history = load_conversation_history(session_id)
-    logger.info(f"Loaded {len(conversation_history)} messages from database for session {session_id}")
+    # Load conversation history from database (after this session's queued writes land)
+    await wait_for_session_saves(session_id)
+    conversation_history = load_conversation_history(session_id, limit=MAX_CONTEXT_MESSAGES)
+    logger.debug("Loaded %d messages from database for session %s", len(conversation_history), session_id)
     
     # Convert request messages to LangChain format (only new messages)
+    turn_ts = time.time()
     new_messages = []
+    turn_entries = []  # Session log entries added this turn
     for msg in request.messages:
         if msg.role == "user":
             new_messages.append(HumanMessage(content=msg.content))
-            # Save user message immediately
-            sessions[session_id]["messages"].append({
-                "role": "user",
-                "content": msg.content,
-                "timestamp": datetime.now().isoformat()
-            })
-            logger.info(f"Saved user message to session {session_id}")
+            turn_entries.append({"role": "user", "content": msg.content, "ts": turn_ts})
         elif msg.role == "assistant":
             new_messages.append(AIMessage(content=msg.content))
+    # Save user messages immediately
+    sessions[session_id]["messages"].extend(turn_entries)
     
     # Combine history + new messages for context
     all_messages = conversation_history + new_messages
-    logger.info(f"Total context: {len(all_messages)} messages ({len(conversation_history)} from history + {len(new_messages)} new)")
+    logger.debug("Total context: %d messages (%d from history + %d new)", len(all_messages), len(conversation_history), len(new_messages))
     
     
     async def generate():
         try:
-            # Import LLM directly for true token streaming
-            from langchain_ollama import ChatOllama
-            from langchain_core.messages import SystemMessage
-            from config import OLLAMA_BASE_URL, SYSTEM_PROMPTS
-            
-            # Initialize LLM for direct streaming
-            llm = ChatOllama(
-                model=model,
-                base_url=OLLAMA_BASE_URL,
-                temperature=0.7,
-            )
-            
-            # Limit context and add system message
-            streaming_messages = all_messages
-            if len(streaming_messages) > 20:
-                streaming_messages = streaming_messages[-20:]
-                logger.info(f"Trimmed to last 20 messages for streaming")
+            # Reuse the cached LLM client for direct streaming
+            llm = get_llm(model)
             
-            # Add system message if not present
-            system_prompt = SYSTEM_PROMPTS.get(request.language, SYSTEM_PROMPTS["en"])
-            if not streaming_messages or not isinstance(streaming_messages[0], SystemMessage):
-                streaming_messages = [SystemMessage(content=system_prompt)] + streaming_messages
+            # Limit context and prepend the shared system message in one allocation
+            # (history and request messages never carry their own system message)
+            if len(all_messages) > MAX_CONTEXT_MESSAGES:
+                logger.debug("Trimmed to last %d messages for streaming", MAX_CONTEXT_MESSAGES)
+            streaming_messages = [get_system_message(request.language), *all_messages[-MAX_CONTEXT_MESSAGES:]]
             
             full_response = ""
+            # Constant tail of every token event, encoded once per stream
+            token_suffix = b',"done":false,"session_id":' + orjson.dumps(session_id) + b'}\n\n'
             
-            logger.info(f"Starting TRUE token-level streaming for session {session_id}")
+            logger.debug("Starting token-level streaming for session %s", session_id)
             
             # TRUE token-level streaming directly from LLM
             async for chunk in llm.astream(streaming_messages):
@@ -201,31 +191,28 @@ async def chat_stream_endpoint(request: ChatRequest):
                     if isinstance(content, str) and content:
                         full_response += content
                         # Yield each token as it arrives
-                        yield f"data: {json.dumps({'text': content, 'done': False, 'session_id': session_id})}\n\n"
+                        yield b'data: {"text":' + orjson.dumps(content) + token_suffix
             
             # Save both user and AI messages to database
             if full_response:
                 ai_message = AIMessage(content=full_response)
-                save_messages(session_id, new_messages + [ai_message])
-                logger.info(f"Saved {len(new_messages) + 1} messages to database for session {session_id}")
+                await queue_save(session_id, new_messages + [ai_message])
+                logger.debug("Queued %d messages for database save for session %s", len(new_messages) + 1, session_id)
                 
                 # Also save AI response to session file
-                sessions[session_id]["messages"].append({
-                    "role": "assistant",
-                    "content": full_response,
-                    "timestamp": datetime.now().isoformat()
-                })
-                logger.info(f"Saved AI response to session {session_id}")
+                entry = {"role": "assistant", "content": full_response, "ts": time.time()}
+                sessions[session_id]["messages"].append(entry)
+                logger.debug("Saved AI response to session %s", session_id)
                 
             
             # Send final done message
             sessions[session_id]["message_count"] += 1
-            yield f"data: {json.dumps({'text': '', 'done': True, 'session_id': session_id})}\n\n"
+            yield b"data: " + orjson.dumps({"text": "", "done": True, "session_id": session_id}) + b"\n\n"
             logger.info(f"Chat stream completed for session: {session_id}. Total messages: {len(sessions[session_id]['messages'])}")
             
         except Exception as e:
             logger.error(f"Chat stream error: {str(e)}", exc_info=True)
-            yield f"data: {json.dumps({'error': str(e), 'session_id': session_id})}\n\n"
+            yield b"data: " + orjson.dumps({"error": str(e), "session_id": session_id}) + b"\n\n"
     
     return StreamingResponse(
         generate(),
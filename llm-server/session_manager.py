@@ -3,6 +3,8 @@ Session management utilities for storing conversation history
 """
 import json
 import logging
+from collections import deque
+from datetime import datetime
 from typing import Optional, Dict
 from pathlib import Path
 from config import CONVERSATIONS_DIR
@@ -12,13 +14,39 @@ logger = logging.getLogger(__name__)
 # In-memory session storage
 sessions: Dict[str, dict] = {}
 
+# Per-session message log is bounded; older entries drop off the front
+MAX_SESSION_MESSAGES = 200
+
+
+def new_session(language: str) -> dict:
+    """Create an empty in-memory session record"""
+    return {
+        "created_at": datetime.now().isoformat(),
+        "language": language,
+        "message_count": 0,
+        "messages": deque(maxlen=MAX_SESSION_MESSAGES),  # Store conversation history
+    }
+
+
+def serialize_messages(messages) -> list:
+    """Convert stored messages (epoch `ts`) to JSON-ready dicts with ISO timestamps"""
+    return [
+        {
+            "role": msg["role"],
+            "content": msg["content"],
+            "timestamp": datetime.fromtimestamp(msg["ts"]).isoformat(),
+        }
+        for msg in messages
+    ]
+
 
 def save_session_to_file(session_id: str, session_data: dict):
     """Save session data to a JSON file"""
     try:
         file_path = CONVERSATIONS_DIR / f"{session_id}.json"
+        snapshot = {**session_data, "messages": serialize_messages(session_data.get("messages", []))}
         with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(session_data, f, indent=2, ensure_ascii=False)
+            json.dump(snapshot, f, indent=2, ensure_ascii=False)
         logger.info(f"Saved session {session_id} to {file_path}")
     except Exception as e:
         logger.error(f"Error saving session {session_id}: {e}")
@@ -15,6 +15,29 @@ from workflow import get_workflow
 def print_separator():
     print("\n" + "="*60 + "\n")
 
+def test_history_limit_growth():
+    """A larger limit after a smaller one must reload the trimmed history"""
+    test_session = "test_session_limit"
+    clear_conversation(test_session)
+    try:
+        save_messages(test_session, [
+            HumanMessage(content=f"question {i}") if i % 2 == 0 else AIMessage(content=f"answer {i}")
+            for i in range(30)
+        ])
+        
+        small = load_conversation_history(test_session, limit=4)
+        assert [m.content for m in small] == ["question 26", "answer 27", "question 28", "answer 29"]
+        
+        larger = load_conversation_history(test_session, limit=20)
+        assert len(larger) == 20, f"expected 20 messages, got {len(larger)}"
+        assert larger[0].content == "question 10" and larger[-1].content == "answer 29"
+        
+        full = load_conversation_history(test_session)
+        assert len(full) == 30, f"expected 30 messages, got {len(full)}"
+        print("✅ History limit growth test passed")
+    finally:
+        clear_conversation(test_session)
+
 async def test_conversation_memory():
     """Test the conversation memory system"""
     
@@ -150,6 +173,7 @@ async def test_conversation_memory():
 
 if __name__ == "__main__":
     try:
+        test_history_limit_growth()
         asyncio.run(test_conversation_memory())
     except Exception as e:
         print(f"\n❌ TEST FAILED: {e}")
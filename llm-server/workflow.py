@@ -2,11 +2,13 @@
 LangGraph workflow for LLM chat with memory
 """
 import logging
+import threading
 from typing import Dict
+import httpx
 from langchain_ollama import ChatOllama
 from langchain_core.messages import SystemMessage, AIMessage
 from langgraph.graph import START, MessagesState, StateGraph
-from config import OLLAMA_BASE_URL, SYSTEM_PROMPTS
+from config import OLLAMA_BASE_URL, SYSTEM_PROMPTS, LLM_BACKEND, VLLM_BASE_URL, VLLM_API_KEY, MAX_CONTEXT_MESSAGES
 from conversation_memory import load_conversation_history, save_messages
 
 logger = logging.getLogger(__name__)
@@ -14,6 +16,60 @@ logger = logging.getLogger(__name__)
 # Cache workflows to reuse them (key: "model:language")
 _workflow_cache: Dict[str, any] = {}
 
+# Cache chat model clients to reuse them (key: "backend:model:temperature")
+_llm_cache: Dict[str, any] = {}
+_llm_lock = threading.Lock()
+
+# One shared SystemMessage per language, built once at import
+_SYSTEM_MESSAGES: Dict[str, SystemMessage] = {
+    language: SystemMessage(content=prompt) for language, prompt in SYSTEM_PROMPTS.items()
+}
+
+# Connection pool limits for LLM HTTP clients, so concurrent chats don't queue on one connection
+LLM_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+
+
+def get_system_message(language: str) -> SystemMessage:
+    """Return the cached system message for a language (English fallback)"""
+    return _SYSTEM_MESSAGES.get(language) or _SYSTEM_MESSAGES["en"]
+
+
+def create_llm(model: str, temperature: float = 0.7):
+    """Create a chat model client for the configured backend"""
+    if LLM_BACKEND == "vllm":
+        # vLLM serves an OpenAI-compatible API; concurrent streams share continuous batching
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
+            model=model,
+            base_url=VLLM_BASE_URL,
+            api_key=VLLM_API_KEY,
+            temperature=temperature,
+            http_async_client=httpx.AsyncClient(limits=LLM_HTTP_LIMITS),
+        )
+    
+    return ChatOllama(
+        model=model,
+        base_url=OLLAMA_BASE_URL,
+        temperature=temperature,
+        client_kwargs={"limits": LLM_HTTP_LIMITS},
+    )
+
+
+def get_llm(model: str, temperature: float = 0.7):
+    """Get or create a cached chat model client"""
+    cache_key = f"{LLM_BACKEND}:{model}:{temperature}"
+    
+    llm = _llm_cache.get(cache_key)
+    if llm is None:
+        with _llm_lock:
+            llm = _llm_cache.get(cache_key)
+            if llm is None:  # double-checked
+                logger.info(f"Creating new LLM client for {cache_key}")
+                llm = create_llm(model, temperature)
+                _llm_cache[cache_key] = llm
+    
+    return llm
+
 
 def get_workflow(model: str, language: str):
     """Get or create a cached workflow"""
@@ -29,41 +85,35 @@ def get_workflow(model: str, language: str):
 def create_workflow(model: str, language: str):
     """Create a stateful workflow for conversation"""
     
-    # Initialize Ollama model
-    llm = ChatOllama(
-        model=model,
-        base_url=OLLAMA_BASE_URL,
-        temperature=0.7
-    )
+    # Reuse the shared chat model client
+    llm = get_llm(model)
     
     # Define system message based on language
-    system_prompt = SYSTEM_PROMPTS.get(language, SYSTEM_PROMPTS["en"])
+    system_message = get_system_message(language)
     
-    def call_model(state: MessagesState):
+    async def call_model(state: MessagesState):
         # Get existing messages from state
         messages = state["messages"]
-        logger.info(f"call_model received {len(messages)} messages in state")
-        
-        # Log all messages for debugging
-        for i, msg in enumerate(messages):
-            msg_type = type(msg).__name__
-            content_preview = str(msg.content)[:80] if hasattr(msg, 'content') else 'no content'
-            logger.info(f"  Msg {i+1}: {msg_type} - {content_preview}...")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("call_model received %d messages in state", len(messages))
+            for i, msg in enumerate(messages):
+                content_preview = str(msg.content)[:80] if hasattr(msg, 'content') else 'no content'
+                logger.debug("  Msg %d: %s - %s...", i + 1, type(msg).__name__, content_preview)
         
-        # Keep only last 10 conversation messages (user + assistant pairs)
+        # Keep only the shared context window (user + assistant pairs)
         # This limits context but keeps memory usage reasonable
-        if len(messages) > 20:  # 20 messages = 10 conversation turns
-            messages = messages[-20:]
-            logger.info(f"Trimmed to last 20 messages (10 conversation turns)")
+        if len(messages) > MAX_CONTEXT_MESSAGES:
+            messages = messages[-MAX_CONTEXT_MESSAGES:]
+            logger.debug("Trimmed to last %d messages", MAX_CONTEXT_MESSAGES)
         
         # Add system message at the beginning if not present
         if not messages or not isinstance(messages[0], SystemMessage):
-            messages = [SystemMessage(content=system_prompt)] + messages
-            logger.info(f"Added system message. Total messages to LLM: {len(messages)}")
+            messages = [system_message, *messages]
+            logger.debug("Added system message. Total messages to LLM: %d", len(messages))
         
-        # Get AI response using streaming (but collect full response)
+        # Get AI response using async streaming (but collect full response)
         full_content = ""
-        for chunk in llm.stream(messages):
+        async for chunk in llm.astream(messages):
             if hasattr(chunk, 'content') and chunk.content:
                 content = chunk.content
                 if isinstance(content, str):
@@ -17,6 +17,38 @@ compute_type = "float16" if device == "cuda" else "int8"
 model = WhisperModel("distil-large-v2", device=device, compute_type=compute_type)
 security = HTTPBearer()
 MAX_THREADS = 6 # Increased for better concurrent processing
+MAX_CACHED_MODELS = int(os.getenv("MAX_CACHED_MODELS", "3"))  # LRU bound on loaded Whisper models
+
+
+def _available_cpus() -> int:
+    """CPUs this process may actually use, honouring the affinity mask and a cgroup CPU quota.
+
+    os.cpu_count() reports the host's cores even inside a CPU-limited container.
+    """
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 4)
+    for quota_file, period_file in (("/sys/fs/cgroup/cpu.max", None),  # cgroup v2: "<quota> <period>"
+                                    ("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "/sys/fs/cgroup/cpu/cpu.cfs_period_us")):
+        try:
+            with open(quota_file) as f:
+                fields = f.read().split()
+            if period_file is not None:
+                with open(period_file) as f:
+                    fields.append(f.read().strip())
+            quota, period = fields[0], fields[1]
+            if quota not in ("max", "-1"):
+                return max(1, min(cpus, int(quota) // int(period)))
+            break
+        except (OSError, ValueError, IndexError):
+            continue
+    return cpus
+
+# CTranslate2 threading: intra-op threads per decode, and as many parallel decode
+# workers as the available cores can feed without oversubscription
+AVAILABLE_CPUS = _available_cpus()
+CPU_THREADS = int(os.getenv("CPU_THREADS", "4"))
+NUM_WORKERS = int(os.getenv("NUM_WORKERS", str(min(MAX_THREADS, max(1, AVAILABLE_CPUS // CPU_THREADS)))))
+# Shared model download directory so several server processes map the same converted weights
+MODEL_DIR = os.getenv("WHISPER_MODEL_DIR") or None
 
 SUPPORTED_LANGUAGES = (
     "af", "am", "ar", "as", "az", "ba", "be", "bg", "bn", "bo", "br", "bs", "ca", "cs", "cy", "da", "de", "el", "en", "es", "et", "eu", "fa", "fi", "fo", "fr", "gl", "gu", "ha", "haw", "he", "hi", "hr", "ht", "hu", "hy", "id", "is", "it", "ja", "jw", "ka", "kk", "km", "kn", "ko", "la", "lb", "ln", "lo", "lt", "lv", "mg", "mi", "mk", "ml", "mn", "mr", "ms", "mt", "my", "ne", "nl", "nn", "no", "oc", "pa", "pl", "ps", "pt", "ro", "ru", "sa", "sd", "si", "sk", "sl", "sn", "so", "sq", "sr", "su", "sv", "sw", "ta", "te", "tg", "th", "tk", "tl", "tr", "tt", "uk", "ur", "uz", "vi", "yi", "yo", "zh", "yue",
@@ -1,6 +1,8 @@
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 class NumberBeforeExtensionRotatingFileHandler(RotatingFileHandler):
     """RotatingFileHandler variant that names backups as app.1.log instead of app.log.1
@@ -22,21 +24,27 @@ class NumberBeforeExtensionRotatingFileHandler(RotatingFileHandler):
             new_dest = dest
         super().rotate(source, new_dest)
 
-    def getFilesToDelete(self):  # pragma: no cover (mirrors base logic for new naming)
-        # Collect existing rotated files following app.N.log pattern
-        directory = os.path.dirname(self.baseFilename)
-        base = os.path.basename(self.baseFilename)  # app.log
-        stem, ext = os.path.splitext(base)          # ('app', '.log')
-        candidates = []
-        for i in range(1, self.backupCount + 1):
-            path = os.path.join(directory, f"{stem}.{i}{ext}")
-            if os.path.exists(path):
-                candidates.append(path)
-        # If we haven't yet reached backupCount, nothing to delete
-        if len(candidates) <= self.backupCount:
-            return []
-        # Sort by index; delete oldest beyond backupCount
-        return sorted(candidates)[:-self.backupCount]
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._bytes_written = None  # cached size of the current log file; None = resync from disk
+
+    def shouldRollover(self, record):
+        # Track the file size ourselves and only stat/seek the file when near maxBytes
+        if self.maxBytes <= 0:
+            return False
+        if self._bytes_written is None:
+            self._bytes_written = os.path.getsize(self.baseFilename) if os.path.isfile(self.baseFilename) else 0
+        msg_len = len(self.format(record)) + 1  # + newline, as in the base class
+        if self._bytes_written + msg_len >= self.maxBytes:
+            if super().shouldRollover(record):
+                return True
+            self._bytes_written = self.stream.tell()
+        self._bytes_written += msg_len
+        return False
+
+    def doRollover(self):
+        super().doRollover()
+        self._bytes_written = None
 
 def get_logger():
     logger = logging.getLogger("stt-server")
@@ -56,6 +64,12 @@ def get_logger():
     )
     handler.setFormatter(formatter)
 
-    logger.addHandler(handler)
+    # Request threads only enqueue records; a background listener thread does the file I/O
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger.addHandler(QueueHandler(log_queue))
 
     return logger
\ No newline at end of file
@@ -2,24 +2,30 @@
 import concurrent.futures
 import asyncio
 import os
+from functools import partial
 os.environ['KMP_DUPLICATE_LIB_OK']='True'
 
 from faster_whisper import WhisperModel
+from faster_whisper.audio import decode_audio
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Form, Depends, status
 from contextlib import asynccontextmanager
 from fastapi.security import HTTPAuthorizationCredentials
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse, RedirectResponse, HTMLResponse
-from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict, Any, Union
+from fastapi.responses import ORJSONResponse, RedirectResponse, HTMLResponse
+from typing import BinaryIO, List, Dict, Any, Union
+import threading
+from collections import OrderedDict
 
 # Constants
-from constants import device, compute_type, security, MAX_THREADS
+from constants import device, compute_type, security, MAX_CACHED_MODELS, CPU_THREADS, NUM_WORKERS, MODEL_DIR, AVAILABLE_CPUS
 
 # Responses
 from responses import SUCCESSFUL_RESPONSE, BAD_REQUEST_RESPONSE
 from responses import VALIDATION_ERROR_RESPONSE, INTERNAL_SERVER_ERROR_RESPONSE
 
+# CORS
+from cors import AllowAllCORSMiddleware
+
 # Logging configuration
 from logging_config import get_logger
 logger = get_logger()
@@ -28,6 +34,10 @@ logger = get_logger()
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up STT server...")
+    # Warm the larger model in the background; tiny is already loaded and can serve meanwhile
+    logger.info("Pre-loading distil-medium.en model in the background...")
+    warmup = asyncio.create_task(asyncio.to_thread(get_cached_model, "distil-medium.en"))
+    warmup.add_done_callback(_log_warmup_result)
     yield
     # Shutdown
     logger.info("Shutting down STT server...")
@@ -37,90 +47,115 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"Error during thread pool cleanup: {e}")
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
-# Create persistent thread pool for better performance
+# Create persistent thread pool for better performance, one thread per CT2 decode worker
+# so outer threads x intra-op threads stays within the available cores
 from concurrent.futures import ThreadPoolExecutor
-executor = ThreadPoolExecutor(max_workers=MAX_THREADS)
+executor = ThreadPoolExecutor(max_workers=NUM_WORKERS)
+logger.info(f"Thread budget: {NUM_WORKERS} decode workers x {CPU_THREADS} CTranslate2 threads ({AVAILABLE_CPUS} available cores)")
+
+# Cap in-flight decodes at what the model's CTranslate2 workers can actually run;
+# extra requests wait here instead of piling up (with their audio) in the pool
+inference_sem = asyncio.Semaphore(NUM_WORKERS)
+
+async def run_transcription(transcribe, audio_file, filename: str):
+    """Run a bound process_file_sync on the executor once an inference slot is free"""
+    async with inference_sem:
+        return await asyncio.get_running_loop().run_in_executor(executor, transcribe, audio_file, filename)
 
-# Model cache for performance optimization
-model_cache = {}
+# Model cache for performance optimization (LRU, bounded by MAX_CACHED_MODELS)
+model_cache: "OrderedDict[str, WhisperModel]" = OrderedDict()
+_cache_lock = threading.Lock()
+_model_load_locks: Dict[str, threading.Lock] = {}
 
 def get_cached_model(model_name: str):
-    """Get or create a cached model instance"""
-    if model_name not in model_cache:
+    """Get or create a cached model instance.
+
+    Concurrent first requests for the same model share one load; the least
+    recently used model is evicted once more than MAX_CACHED_MODELS are loaded.
+    """
+    with _cache_lock:
+        if model_name in model_cache:
+            model_cache.move_to_end(model_name)
+            return model_cache[model_name]
+        load_lock = _model_load_locks.setdefault(model_name, threading.Lock())
+
+    with load_lock:
+        with _cache_lock:
+            if model_name in model_cache:  # loaded while we waited
+                model_cache.move_to_end(model_name)
+                return model_cache[model_name]
+
         logger.info(f"Loading model '{model_name}' into cache...")
-        model_cache[model_name] = WhisperModel(model_name, device=device, compute_type=compute_type)
+        model = WhisperModel(
+            model_name,
+            device=device,
+            compute_type=compute_type,
+            cpu_threads=CPU_THREADS,
+            num_workers=NUM_WORKERS,
+            download_root=MODEL_DIR,
+        )
         logger.info(f"Model '{model_name}' loaded successfully")
-    return model_cache[model_name]
+
+        with _cache_lock:
+            model_cache[model_name] = model
+            while len(model_cache) > MAX_CACHED_MODELS:
+                evicted_name, _ = model_cache.popitem(last=False)
+                logger.info(f"Evicted model '{evicted_name}' from cache")
+        return model
 
 # Pre-load the tiny model at startup for maximum speed
 logger.info("Pre-loading tiny model for maximum speed...")
 get_cached_model("tiny")
-logger.info("Pre-loading base model for balanced performance...")
-get_cached_model("distil-medium.en")
 
-def process_file_sync(file_content: bytes, filename: str, model, initial_prompt: str, language: str, word_timestamps: bool, vad_filter: bool, min_silence_duration_ms: int):
-    """Optimized synchronous file processing with minimal I/O overhead"""
-    import tempfile
-    import os
-    from utils import get_file_extension, create_segment_data
+def _log_warmup_result(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background model pre-load failed: {task.exception()}")
+
+def process_file_sync(audio_file: BinaryIO, filename: str, model, initial_prompt: str, language: str, word_timestamps: bool, vad_filter: bool, min_silence_duration_ms: int):
+    """Optimized synchronous file processing, decoding the upload without copying it"""
+    from utils import segment_to_dict
     
-    extension = get_file_extension(filename)
+    # Decode straight from the upload's spooled file to 16 kHz mono float32 (no temp file round-trip)
+    audio = decode_audio(audio_file, sampling_rate=model.feature_extractor.sampling_rate)
     
-    # Use temporary file with optimized settings
-    temp_file = tempfile.NamedTemporaryFile(suffix=extension, delete=False, buffering=0)
-    try:
-        # Write and flush immediately for faster access
-        temp_file.write(file_content)
-        temp_file.flush()
-        os.fsync(temp_file.fileno())  # Ensure it's written to disk
-        temp_file.close()
-        
-        # Transcribe with maximum speed optimization for base model
-        vad_parameters = dict(min_silence_duration_ms=min_silence_duration_ms) if vad_filter else None
-        segments, info = model.transcribe(
-            temp_file.name, 
-            initial_prompt=initial_prompt, 
-            language=language, 
-            beam_size=1,  # Fastest decoding
-            best_of=1,    # Single pass
-            temperature=0,  # Deterministic and faster
-            vad_filter=vad_filter, 
-            vad_parameters=vad_parameters, 
-            word_timestamps=word_timestamps,
-            condition_on_previous_text=False,  # Faster for short audio
-            patience=1.0,  # Reduce patience for faster processing
-            length_penalty=1.0  # No length penalty for speed
-        )
-        
-        # Process segments efficiently
-        segment_list = list(segments)
-        segment_data = create_segment_data(segment_list, word_timestamps)
-        full_text = " ".join([segment["text"] for segment in segment_data]).strip()
-        
-        return {
-            "filename": filename,
-            "detected_language": info.language,
-            "language_probability": info.language_probability,
-            "text": full_text,
-            "segments": segment_data
-        }
-    finally:
-        try:
-            os.unlink(temp_file.name)
-        except:
-            pass  # Ignore cleanup errors for speed
-
-origins = ["*"]
+    # Transcribe with maximum speed optimization for base model
+    vad_parameters = dict(min_silence_duration_ms=min_silence_duration_ms) if vad_filter else None
+    segments, info = model.transcribe(
+        audio, 
+        initial_prompt=initial_prompt, 
+        language=language, 
+        beam_size=1,  # Fastest decoding
+        best_of=1,    # Single pass
+        temperature=0,  # Deterministic and faster
+        vad_filter=vad_filter, 
+        vad_parameters=vad_parameters, 
+        word_timestamps=word_timestamps,
+        condition_on_previous_text=False,  # Faster for short audio
+        patience=1.0,  # Reduce patience for faster processing
+        length_penalty=1.0  # No length penalty for speed
+    )
+    
+    # Process segments in a single pass as the generator yields them
+    segment_data = []
+    texts = []
+    for segment in segments:
+        segment_dict = segment_to_dict(segment, word_timestamps)
+        segment_data.append(segment_dict)
+        texts.append(segment_dict["text"])
+    full_text = " ".join(texts).strip()
+    
+    return {
+        "filename": filename,
+        "detected_language": info.language,
+        "language_probability": info.language_probability,
+        "text": full_text,
+        "segments": segment_data
+    }
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# CORS: every origin is allowed (see cors.py)
+app.add_middleware(AllowAllCORSMiddleware)
 
 # Helper functions
 from utils import authenticate_user
@@ -216,32 +251,27 @@ async def transcribe_audio(credentials: HTTPAuthorizationCredentials = Depends(s
         validate_parameters(file, language, model, vad_filter, min_silence_duration_ms, response_format, timestamp_granularities)
         word_timestamps = timestamp_granularities == "word"
         
-        # Get cached model instance for much better performance
-        m = get_cached_model(model)
+        # Get cached model instance for much better performance; a cold load (or
+        # waiting on the background pre-load) happens off the event loop
+        m = await asyncio.to_thread(get_cached_model, model)
         
         # Process files using the optimized synchronous approach
-        loop = asyncio.get_event_loop()
+        # Bind the per-request settings once; only the file varies per task
+        transcribe = partial(
+            process_file_sync,
+            model=m,
+            initial_prompt=initial_prompt,
+            language=language,
+            word_timestamps=word_timestamps,
+            vad_filter=vad_filter,
+            min_silence_duration_ms=min_silence_duration_ms,
+        )
         futures = []
         
         for f in file:
-            # Read file content first
-            file_content = await f.read()
-            # Reset file pointer for potential future reads
-            await f.seek(0)
-            
-            # Submit to thread pool with optimized synchronous processing
-            future = loop.run_in_executor(
-                executor, 
-                process_file_sync,
-                file_content,
-                f.filename or f"audio_{len(futures)+1}.wav",
-                m,
-                initial_prompt,
-                language,
-                word_timestamps,
-                vad_filter,
-                min_silence_duration_ms
-            )
+            # Submit to thread pool (bounded by inference slots) with optimized synchronous processing;
+            # the worker reads the upload's own spooled file rather than a bytes copy of it
+            future = run_transcription(transcribe, f.file, f.filename or f"audio_{len(futures)+1}.wav")
             futures.append(future)
         
         # Wait for all files to be processed concurrently
@@ -269,7 +299,7 @@ async def transcribe_audio(credentials: HTTPAuthorizationCredentials = Depends(s
                     transcriptions = transcription_result
         
         logger.info(f"Transcription completed successfully for {len(file)} file(s).")
-        return JSONResponse(content=transcriptions)
+        return ORJSONResponse(content=transcriptions)
         
     except HTTPException:
         raise
@@ -279,7 +309,7 @@ async def transcribe_audio(credentials: HTTPAuthorizationCredentials = Depends(s
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content=exc.detail,
     )
@@ -289,7 +319,7 @@ async def generic_exception_handler(request: Request, exc: Exception):
     error_type = type(exc).__name__
     if isinstance(exc, ValueError) or isinstance(exc, TypeError):
         status_code = 400
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status_code,
         content={
             "error": {
@@ -304,7 +334,7 @@ async def generic_exception_handler(request: Request, exc: Exception):
 async def validation_exception_handler(request, exc):
     details = exc.errors()[0]['msg']
     loc = exc.errors()[0]['loc']  
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=422,
         content={
             "error": {
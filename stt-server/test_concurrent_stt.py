@@ -11,12 +11,13 @@ import numpy as np
 
 def create_test_audio(duration_seconds=5, sample_rate=16000, frequency=440):
     """Create a simple test audio file in memory"""
-    # Generate a sine wave
-    t = np.linspace(0, duration_seconds, int(sample_rate * duration_seconds), False)
-    wave_data = np.sin(frequency * 2 * np.pi * t)
-    
-    # Convert to 16-bit integers
-    wave_data = (wave_data * 32767).astype(np.int16)
+    # Generate a sine wave in float32, scaled and cast to 16-bit integers in place
+    n = int(sample_rate * duration_seconds)
+    phase = np.arange(n, dtype=np.float32)
+    phase *= np.float32(2 * np.pi * frequency / sample_rate)
+    wave_data = np.sin(phase, out=phase)
+    wave_data *= np.float32(32767)
+    wave_data = wave_data.astype(np.int16)
     
     # Create WAV file in memory
     buffer = io.BytesIO()
@@ -32,7 +33,7 @@ def create_test_audio(duration_seconds=5, sample_rate=16000, frequency=440):
 async def make_transcription_request(session, url, audio_data, request_id=None):
     """Make a single STT request"""
     
-    start_time = time.time()
+    start_time = time.perf_counter()
     try:
         # Prepare the multipart form data
         data = aiohttp.FormData()
@@ -47,17 +48,17 @@ async def make_transcription_request(session, url, audio_data, request_id=None):
         async with session.post(url, data=data) as response:
             if response.status == 200:
                 result = await response.json()
-                end_time = time.time()
+                end_time = time.perf_counter()
                 text = result.get('text', 'No transcription found')
                 print(f"Request {request_id}: SUCCESS - '{text[:50]}...' in {end_time - start_time:.2f}s")
                 return True, text, end_time - start_time
             else:
                 error_text = await response.text()
-                end_time = time.time()
+                end_time = time.perf_counter()
                 print(f"Request {request_id}: FAILED - Status {response.status}: {error_text}")
                 return False, "", end_time - start_time
     except Exception as e:
-        end_time = time.time()
+        end_time = time.perf_counter()
         print(f"Request {request_id}: ERROR - {str(e)}")
         return False, "", end_time - start_time
 
@@ -70,11 +71,12 @@ async def test_concurrent_requests(server_url="http://localhost:5200/v1/transcri
     # Create test audio files with different frequencies for variety
     test_audio_files = []
     frequencies = [440, 523, 659, 784, 880]  # Musical notes
-    
+    # Generate each clip once and reuse it for every request with the same note
+    audio_by_frequency = {freq: create_test_audio(duration_seconds=3, frequency=freq) for freq in frequencies}
+
     for i in range(num_requests):
         freq = frequencies[i % len(frequencies)]
-        audio_data = create_test_audio(duration_seconds=3, frequency=freq)
-        test_audio_files.append(audio_data)
+        test_audio_files.append(audio_by_frequency[freq])
     
     # Add authentication header with dummy API key
     headers = {"Authorization": "Bearer dummy_api_key"}
@@ -88,9 +90,9 @@ async def test_concurrent_requests(server_url="http://localhost:5200/v1/transcri
             tasks.append(task)
         
         # Execute all requests concurrently
-        start_time = time.time()
+        start_time = time.perf_counter()
         results = await asyncio.gather(*tasks, return_exceptions=True)
-        end_time = time.time()
+        end_time = time.perf_counter()
         
         # Analyze results
         successful = sum(1 for result in results if isinstance(result, tuple) and result[0])
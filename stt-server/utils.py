@@ -37,25 +37,25 @@ async def transcribe_temp_file(file: UploadFile, extension: str, model: WhisperM
         os.unlink(temp_file.name)
     return segments, info
 
+
+def segment_to_dict(segment, word_timestamps: bool):
+    segment_dict = {
+        "text": segment.text.strip(),
+        "start": segment.start,
+        "end": segment.end,
+    }
+    if word_timestamps:
+        segment_dict["words"] = [
+            {"word": word.word.strip(), "start": word.start, "end": word.end}
+            for word in segment.words
+        ]
+    return segment_dict
+
+
 def create_segment_data(segments: list, word_timestamps: bool):
-    segment_data = []
-    for segment in segments:
-        segment_dict = {
-            "text": segment.text.strip(),
-            "start": segment.start,
-            "end": segment.end,
-        }
-        if word_timestamps:
-            words_data = []
-            for word in segment.words:
-                words_data.append({
-                    "word": word.word.strip(),
-                    "start": word.start,
-                    "end": word.end
-                })
-            segment_dict["words"] = words_data
-        segment_data.append(segment_dict)
-    return segment_data
+    return [segment_to_dict(segment, word_timestamps) for segment in segments]
+
+
 async def process_file(file: UploadFile, model: WhisperModel, initial_prompt: str, language: str, word_timestamps: bool, vad_filter: bool,  min_silence_duration_ms: int):
     extension = get_file_extension(file.filename)
     segments, info = await transcribe_temp_file(file, extension, model, initial_prompt, language, word_timestamps, vad_filter, min_silence_duration_ms)
@@ -34,6 +34,19 @@ VOICE_MODELS = {
     # "te": "./voice_samples/te_IN-padmavathi-medium.onnx",
 }
 
+# Prefer INT8-quantized voices (see quantize_voices.py) when they sit next to the FP32 model
+USE_QUANTIZED_VOICES = os.getenv("USE_QUANTIZED_VOICES", "true").lower() == "true"
+
+def get_voice_path(model_path: str) -> str:
+    """Return the .int8.onnx variant of a voice model if present, else the original path"""
+    if USE_QUANTIZED_VOICES:
+        quantized_path = str(Path(model_path).with_suffix(".int8.onnx"))
+        if os.path.exists(quantized_path) and os.path.exists(quantized_path + ".json"):
+            return quantized_path
+    return model_path
+
+VOICE_MODELS = {language: get_voice_path(path) for language, path in VOICE_MODELS.items()}
+
 # Output configuration (now using dynamic file names)
 # OUTPUT_FILE = "output.wav"  # Removed - now using unique files per request
 
@@ -41,6 +54,14 @@ VOICE_MODELS = {
 HOST = "0.0.0.0"
 PORT = 5100
 
+# Maximum syntheses running at once (each one keeps ONNX Runtime busy on several cores)
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "4"))
+
+# Cache of synthesized audio for repeated short phrases (0 disables)
+TTS_CACHE_SIZE = int(os.getenv("TTS_CACHE_SIZE", "512"))
+TTS_CACHE_MAX_TEXT = 200  # only phrases up to this many characters are cached
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # total WAV bytes held
+
 # Logging configuration
 LOG_LEVEL = "INFO"
 
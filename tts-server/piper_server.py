@@ -1,54 +1,106 @@
 """
 TTS Server using Piper with concurrent request handling
 """
-import os
+import hashlib
+import io
+import json
 import subprocess
-import uuid
+import threading
+import wave
 import logging
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
+from anyio import CapacityLimiter, to_thread
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from pydantic import BaseModel
 
-from config import PIPER_EXECUTABLE, VOICE_MODELS, HOST, PORT
+from cors import AllowAllCORSMiddleware
+from config import PIPER_EXECUTABLE, VOICE_MODELS, HOST, PORT, TTS_MAX_CONCURRENCY, TTS_CACHE_SIZE, TTS_CACHE_MAX_TEXT, TTS_CACHE_MAX_BYTES
+
+try:
+    from piper import PiperVoice
+except ImportError:  # piper-tts not installed; fall back to the Piper CLI
+    PiperVoice = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Thread pool for handling concurrent TTS requests
-executor = ThreadPoolExecutor(max_workers=8)
+# Bound concurrent syntheses; excess requests wait cheaply on the event loop
+tts_limiter = CapacityLimiter(TTS_MAX_CONCURRENCY)
+
+# Voices loaded in-process (language -> PiperVoice), so the ONNX model stays resident
+_voices = {}
+_voices_lock = threading.Lock()
+
+def get_voice(language: str):
+    """Load (or return cached) in-process Piper voice; None if the Python bindings are unavailable"""
+    if PiperVoice is None:
+        return None
+    voice = _voices.get(language)
+    if voice is None:
+        with _voices_lock:
+            voice = _voices.get(language)
+            if voice is None:  # double-checked
+                logger.info(f"Loading Piper voice for '{language}': {VOICE_MODELS[language]}")
+                voice = PiperVoice.load(VOICE_MODELS[language])
+                _voices[language] = voice
+    return voice
+
+# LRU of synthesized audio for repeated short phrases: (language, text digest) -> WAV bytes,
+# bounded by both entry count and total bytes held
+_audio_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+_audio_cache_bytes = 0
+_audio_cache_lock = threading.Lock()
+
+def _cache_key(text: str, language: str) -> tuple:
+    return (language, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest())
+
+def get_cached_audio(text: str, language: str):
+    """Return cached WAV bytes for this phrase, or None"""
+    if len(text) > TTS_CACHE_MAX_TEXT:
+        return None
+    key = _cache_key(text, language)
+    with _audio_cache_lock:
+        wav_bytes = _audio_cache.get(key)
+        if wav_bytes is not None:
+            _audio_cache.move_to_end(key)
+        return wav_bytes
+
+def store_cached_audio(text: str, language: str, wav_bytes: bytes):
+    """Remember synthesized audio for short phrases, evicting the least recently used"""
+    global _audio_cache_bytes
+    if TTS_CACHE_SIZE <= 0 or len(text) > TTS_CACHE_MAX_TEXT or len(wav_bytes) > TTS_CACHE_MAX_BYTES:
+        return
+    key = _cache_key(text, language)
+    with _audio_cache_lock:
+        previous = _audio_cache.pop(key, None)
+        if previous is not None:
+            _audio_cache_bytes -= len(previous)
+        _audio_cache[key] = wav_bytes
+        _audio_cache_bytes += len(wav_bytes)
+        while len(_audio_cache) > TTS_CACHE_SIZE or _audio_cache_bytes > TTS_CACHE_MAX_BYTES:
+            _, evicted = _audio_cache.popitem(last=False)
+            _audio_cache_bytes -= len(evicted)
 
 class TTSRequest(BaseModel):
     text: str
     language: str = "en"
 
-class CleanupFileResponse(FileResponse):
-    """FileResponse that deletes the file after sending"""
-    def __init__(self, path, *args, **kwargs):
-        super().__init__(path, *args, **kwargs)
-        self.file_path = path
-    
-    async def __call__(self, scope, receive, send):
-        try:
-            await super().__call__(scope, receive, send)
-        finally:
-            # Clean up the temporary file
-            try:
-                if os.path.exists(self.file_path):
-                    os.remove(self.file_path)
-                    logger.info(f"Cleaned up temporary file: {self.file_path}")
-            except Exception as e:
-                logger.error(f"Failed to clean up file {self.file_path}: {e}")
+@lru_cache(maxsize=None)
+def get_sample_rate(voice_model: str) -> int:
+    """Read the output sample rate from the voice's .onnx.json config"""
+    with open(f"{voice_model}.json", "r", encoding="utf-8") as f:
+        return json.load(f)["audio"]["sample_rate"]
 
-def generate_audio(text: str, language: str = "en") -> str:
+def generate_audio(text: str, language: str = "en") -> bytes:
     """
     Generate audio using Piper TTS synchronously.
-    Returns the path to the generated audio file.
+    Returns the WAV file contents, built entirely in memory.
     """
     try:
         # Get the voice model for the specified language
@@ -56,15 +108,21 @@ def generate_audio(text: str, language: str = "en") -> str:
             raise ValueError(f"Unsupported language: {language}")
         
         voice_model = VOICE_MODELS[language]
+        buffer = io.BytesIO()
         
-        # Generate unique output filename to avoid conflicts
-        output_file = f"output_{uuid.uuid4().hex}.wav"
+        voice = get_voice(language)
+        if voice is not None:
+            # In-process synthesis with the resident model (no process spawn or model reload)
+            with wave.open(buffer, "wb") as wav_file:
+                synthesize = getattr(voice, "synthesize_wav", None) or voice.synthesize
+                synthesize(text, wav_file)
+            return buffer.getvalue()
         
-        # Construct the Piper command
+        # Construct the Piper command (raw 16-bit mono PCM on stdout)
         cmd = [
             PIPER_EXECUTABLE,
             "--model", voice_model,
-            "--output_file", output_file
+            "--output_raw"
         ]
         
         logger.info(f"Running Piper command: {' '.join(cmd)}")
@@ -73,32 +131,31 @@ def generate_audio(text: str, language: str = "en") -> str:
         # Run Piper with text input
         result = subprocess.run(
             cmd,
-            input=text,
-            text=True,
+            input=text.encode("utf-8"),
             capture_output=True,
             check=True
         )
         
-        logger.info(f"Piper completed successfully. Output: {result.stdout}")
+        if not result.stdout:
+            raise RuntimeError("Piper produced no audio")
         
-        # Verify output file was created
-        if not os.path.exists(output_file):
-            raise RuntimeError(f"Output file {output_file} was not created")
+        # Wrap the PCM in a WAV header
+        with wave.open(buffer, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(get_sample_rate(voice_model))
+            wav_file.writeframes(result.stdout)
         
-        return output_file
+        logger.info(f"Piper completed successfully ({len(result.stdout)} bytes of audio)")
+        return buffer.getvalue()
         
     except subprocess.CalledProcessError as e:
+        stderr = e.stderr.decode("utf-8", errors="replace") if e.stderr else ""
         logger.error(f"Piper command failed: {e}")
-        logger.error(f"Stderr: {e.stderr}")
-        # Clean up partial file if it exists
-        if 'output_file' in locals() and os.path.exists(output_file):
-            os.remove(output_file)
-        raise RuntimeError(f"TTS generation failed: {e.stderr}")
+        logger.error(f"Stderr: {stderr}")
+        raise RuntimeError(f"TTS generation failed: {stderr}")
     except Exception as e:
         logger.error(f"Error in generate_audio: {e}")
-        # Clean up partial file if it exists
-        if 'output_file' in locals() and os.path.exists(output_file):
-            os.remove(output_file)
         raise
 
 @asynccontextmanager
@@ -108,27 +165,29 @@ async def lifespan(app: FastAPI):
     logger.info(f"Using Piper executable: {PIPER_EXECUTABLE}")
     logger.info(f"Available voice models: {list(VOICE_MODELS.keys())}")
     
-    # Verify Piper executable exists
-    if not Path(PIPER_EXECUTABLE).exists() and PIPER_EXECUTABLE != "piper":
-        logger.warning(f"Piper executable not found at: {PIPER_EXECUTABLE}")
+    if PiperVoice is not None:
+        # Load voices up front so the first request doesn't pay for ONNX session setup
+        for language in VOICE_MODELS:
+            try:
+                get_voice(language)
+            except Exception as e:
+                logger.error(f"Failed to load Piper voice for '{language}': {e}")
+    else:
+        logger.warning("piper-tts Python package not available, using Piper executable per request")
+        # Verify Piper executable exists
+        if not Path(PIPER_EXECUTABLE).exists() and PIPER_EXECUTABLE != "piper":
+            logger.warning(f"Piper executable not found at: {PIPER_EXECUTABLE}")
     
     yield
     
     # Shutdown
     logger.info("Shutting down TTS server...")
-    executor.shutdown(wait=False)
 
 # Create FastAPI app with lifespan
 app = FastAPI(title="Piper TTS Server", lifespan=lifespan)
 
 # Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allows all origins
-    allow_credentials=True,
-    allow_methods=["*"],  # Allows all methods
-    allow_headers=["*"],  # Allows all headers
-)
+app.add_middleware(AllowAllCORSMiddleware)
 
 @app.get("/")
 async def health_check():
@@ -158,23 +217,26 @@ async def synthesize_speech(request: TTSRequest):
                 detail=f"Unsupported language: {request.language}. Available: {list(VOICE_MODELS.keys())}"
             )
         
-        # Run TTS generation in thread pool to avoid blocking
-        import asyncio
-        loop = asyncio.get_event_loop()
-        output_file = await loop.run_in_executor(
-            executor, 
-            generate_audio, 
-            request.text, 
-            request.language
-        )
-        
-        logger.info(f"TTS generation completed: {output_file}")
+        wav_bytes = get_cached_audio(request.text, request.language)
+        if wav_bytes is not None:
+            logger.info(f"TTS cache hit: {len(wav_bytes)} bytes")
+        else:
+            # Run TTS generation in a worker thread to avoid blocking
+            wav_bytes = await to_thread.run_sync(
+                generate_audio,
+                request.text,
+                request.language,
+                limiter=tts_limiter
+            )
+            store_cached_audio(request.text, request.language, wav_bytes)
+            
+            logger.info(f"TTS generation completed: {len(wav_bytes)} bytes")
         
-        # Return the audio file (will be cleaned up after sending)
-        return CleanupFileResponse(
-            output_file,
+        # Return the audio straight from memory
+        return Response(
+            content=wav_bytes,
             media_type="audio/wav",
-            filename=f"tts_output_{request.language}.wav"
+            headers={"Content-Disposition": f'attachment; filename="tts_output_{request.language}.wav"'}
         )
         
     except HTTPException:
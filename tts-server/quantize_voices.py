@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+One-time conversion of Piper voice models from FP32 to INT8 weights.
+
+Writes <voice>.int8.onnx (plus a copy of the .onnx.json config) next to each
+model in voice_samples/. config.py picks the quantized file up automatically.
+Requires the `onnx` package in addition to onnxruntime.
+"""
+import shutil
+import sys
+from pathlib import Path
+
+from onnxruntime.quantization import quantize_dynamic, QuantType
+
+VOICE_DIR = Path(__file__).parent / "voice_samples"
+
+def quantize_voice(model_path: Path) -> Path:
+    """Quantize a single voice model and copy its config alongside it"""
+    output_path = model_path.with_suffix(".int8.onnx")
+    quantize_dynamic(str(model_path), str(output_path), weight_type=QuantType.QInt8)
+    # Piper looks for <model>.json next to the model file
+    shutil.copyfile(f"{model_path}.json", f"{output_path}.json")
+    return output_path
+
+def main():
+    models = [Path(arg) for arg in sys.argv[1:]] or sorted(
+        path for path in VOICE_DIR.glob("*.onnx") if not path.name.endswith(".int8.onnx")
+    )
+    for model_path in models:
+        output_path = quantize_voice(model_path)
+        before = model_path.stat().st_size / 1e6
+        after = output_path.stat().st_size / 1e6
+        print(f"{model_path.name}: {before:.1f} MB -> {output_path.name}: {after:.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -2,120 +2,274 @@
 """
 Test script to verify the Piper TTS server can handle multiple concurrent requests
 """
+import argparse
 import asyncio
 import aiohttp
+from yarl import URL
 import time
 import json
+import random
+import statistics
+import socket
 
-async def make_request(session, url, text, language="en", request_id=None):
-    """Make a single TTS request"""
-    payload = {
-        "text": text,
-        "language": language
-    }
+# uvloop has lower per-callback overhead than the default loop; use it when available
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    pass
+
+# Shared request headers; bodies are pre-serialized JSON and the WAV
+# responses are sent uncompressed, so ask for them as-is
+_HDR = {"Content-Type": "application/json", "Accept-Encoding": "identity"}
+
+SYNTHESIZE_URL = "http://localhost:5100/synthesize/"
+
+# Bound every request so a stalled server shows up as a TIMEOUT instead of hanging the run
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=2, sock_connect=2, sock_read=10)
+
+TEST_TEXTS = [
+    "Hello, this is test number one with a much longer message to properly test the text-to-speech system performance under realistic conditions.",
+    "This is the second test message for speech synthesis, designed to evaluate how well the server handles concurrent processing of extended text content.",
+    "Third test message to check concurrent processing capabilities with approximately one hundred characters of meaningful content for thorough testing.",
+    "Fourth message to test the server's ability to handle multiple requests simultaneously while processing longer sentences that are more representative of real usage.",
+    "Final test message number five for concurrent testing, featuring extended text content to simulate realistic workloads and measure performance accurately."
+]
+
+async def make_request(session, url, body, request_id=None, tts_cache=None, report=None):
+    """Make a single TTS request with a pre-encoded JSON body
+
+    Per-request outcomes are appended to report as
+    (request_id, status, bytes, elapsed, ttfb, err) rather than printed, so
+    coroutines never block on terminal writes while requests are in flight.
+    """
+    if report is None:
+        report = []
+    # The body encodes (text, language), so it doubles as the cache key
+    if tts_cache is not None and body in tts_cache:
+        total, elapsed, ttfb = tts_cache[body]
+        report.append((request_id, "CACHED", total, elapsed, ttfb, ""))
+        return True, total, elapsed, ttfb
     
-    start_time = time.time()
+    start_time = time.perf_counter()
     try:
-        async with session.post(url, json=payload) as response:
+        async with session.post(url, data=body, headers=_HDR) as response:
             if response.status == 200:
-                # Read the audio data
-                audio_data = await response.read()
-                end_time = time.time()
-                print(f"Request {request_id}: SUCCESS - {len(audio_data)} bytes in {end_time - start_time:.2f}s")
-                return True, len(audio_data), end_time - start_time
+                # Stream the audio and discard it; only the size and timing matter here
+                total = 0
+                ttfb = None
+                async for chunk in response.content.iter_chunked(65536):
+                    if ttfb is None:
+                        ttfb = time.perf_counter() - start_time
+                    total += len(chunk)
+                end_time = time.perf_counter()
+                report.append((request_id, "SUCCESS", total, end_time - start_time, ttfb, ""))
+                if tts_cache is not None:
+                    tts_cache[body] = (total, end_time - start_time, ttfb)
+                return True, total, end_time - start_time, ttfb
             else:
                 error_text = await response.text()
-                end_time = time.time()
-                print(f"Request {request_id}: FAILED - Status {response.status}: {error_text}")
-                return False, 0, end_time - start_time
+                end_time = time.perf_counter()
+                report.append((request_id, "FAILED", 0, end_time - start_time, None, f"Status {response.status}: {error_text}"))
+                return False, 0, end_time - start_time, None
+    except asyncio.TimeoutError:
+        end_time = time.perf_counter()
+        report.append((request_id, "TIMEOUT", 0, end_time - start_time, None, "request timed out"))
+        return False, 0, end_time - start_time, None
     except Exception as e:
-        end_time = time.time()
-        print(f"Request {request_id}: ERROR - {str(e)}")
-        return False, 0, end_time - start_time
+        end_time = time.perf_counter()
+        report.append((request_id, "ERROR", 0, end_time - start_time, None, str(e)))
+        return False, 0, end_time - start_time, None
+
+async def test_concurrent_requests(session, server_url=SYNTHESIZE_URL, num_requests=5, tts_cache=None,
+                                   qps=None, burstiness=1.0, max_concurrency=None):
+    """Test multiple concurrent requests to the TTS server
 
-async def test_concurrent_requests(server_url="http://localhost:5100/synthesize/", num_requests=5):
-    """Test multiple concurrent requests to the TTS server"""
+    With qps set, requests arrive at that mean rate instead of all at once, with
+    gamma-distributed gaps: burstiness 1.0 is a Poisson process, lower values
+    cluster arrivals into bursts, higher values space them more evenly.
+    max_concurrency caps how many requests are in flight.
+    """
+    
+    if qps:
+        print(f"Testing {num_requests} requests at {qps:.1f} QPS (burstiness {burstiness:.2f}, "
+              f"max {max_concurrency or num_requests} in flight) to {server_url}")
+    else:
+        print(f"Testing {num_requests} concurrent requests to {server_url}")
+    print("-" * 60)
+    
+    # Serialize each payload once and reuse the bytes across requests
+    encoded_bodies = [json.dumps({"text": t, "language": "en"}).encode("utf-8") for t in TEST_TEXTS]
+    
+    # Parse the endpoint once rather than on every session.post call
+    url_obj = URL(server_url, encoded=True)
+    sem = asyncio.Semaphore(max_concurrency or num_requests)
+    
+    async def limited(coro):
+        async with sem:
+            return await coro
+    
+    report = []
+    
+    # Flat (request_id, body) schedule built once up front
+    schedule = [(i+1, encoded_bodies[i % len(encoded_bodies)]) for i in range(num_requests)]
+    
+    # Start requests, spacing arrivals when a target QPS is given
+    start_time = time.perf_counter()
+    tasks = []
+    for request_id, body in schedule:
+        if qps and request_id > 1:
+            # Gamma gaps with shape=burstiness keep the mean gap at 1/qps
+            await asyncio.sleep(random.gammavariate(burstiness, 1.0 / (qps * burstiness)))
+        task = asyncio.create_task(limited(make_request(session, url_obj, body, request_id, tts_cache, report)))
+        tasks.append(task)
+    
+    # Collect results as each request finishes
+    results = []
+    latencies = []
+    for fut in asyncio.as_completed(tasks):
+        result = await fut
+        results.append(result)
+        if result[0]:
+            latencies.append(result[2])
+    end_time = time.perf_counter()
+    
+    # Print per-request outcomes once everything has finished
+    for request_id, status, nbytes, elapsed, ttfb, err in sorted(report):
+        line = f"Request {request_id:>3}: {status:<7} {nbytes:>9} bytes {elapsed:6.2f}s"
+        if ttfb is not None:
+            line += f" (TTFB {ttfb:.2f}s)"
+        if err:
+            line += f" - {err}"
+        print(line)
     
-    test_texts = [
-        "Hello, this is test number one with a much longer message to properly test the text-to-speech system performance under realistic conditions.",
-        "This is the second test message for speech synthesis, designed to evaluate how well the server handles concurrent processing of extended text content.",
-        "Third test message to check concurrent processing capabilities with approximately one hundred characters of meaningful content for thorough testing.",
-        "Fourth message to test the server's ability to handle multiple requests simultaneously while processing longer sentences that are more representative of real usage.",
-        "Final test message number five for concurrent testing, featuring extended text content to simulate realistic workloads and measure performance accurately."
-    ]
+    # Analyze results in a single pass
+    successful = 0
+    total_resp = 0.0
+    total_bytes = 0
+    total_ttfb = 0.0
+    ttfb_count = 0
+    # make_request turns every failure into a tuple, so results need no type checks
+    for ok, nbytes, elapsed, ttfb in results:
+        if ok:
+            successful += 1
+            total_bytes += nbytes
+            total_resp += elapsed
+            if ttfb is not None:
+                total_ttfb += ttfb
+                ttfb_count += 1
+    failed = len(results) - successful
+    total_time = end_time - start_time
     
-    print(f"Testing {num_requests} concurrent requests to {server_url}")
     print("-" * 60)
+    print(f"Test Results:")
+    print(f"  Total requests: {num_requests}")
+    print(f"  Successful: {successful}")
+    print(f"  Failed: {failed}")
+    print(f"  Total time: {total_time:.2f}s")
+    print(f"  Average time per request: {total_time/num_requests:.2f}s")
+    print(f"  Throughput: {total_bytes / total_time if total_time else 0.0:.0f} bytes/s")
     
-    async with aiohttp.ClientSession() as session:
-        # Create tasks for concurrent requests
-        tasks = []
-        for i in range(num_requests):
-            text = test_texts[i % len(test_texts)]
-            task = make_request(session, server_url, text, "en", i+1)
-            tasks.append(task)
-        
-        # Execute all requests concurrently
-        start_time = time.time()
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        end_time = time.time()
-        
-        # Analyze results
-        successful = sum(1 for result in results if isinstance(result, tuple) and result[0])
-        failed = len(results) - successful
-        total_time = end_time - start_time
-        
-        print("-" * 60)
-        print(f"Test Results:")
-        print(f"  Total requests: {num_requests}")
-        print(f"  Successful: {successful}")
-        print(f"  Failed: {failed}")
-        print(f"  Total time: {total_time:.2f}s")
-        print(f"  Average time per request: {total_time/num_requests:.2f}s")
-        
-        if successful > 0:
-            avg_response_time = sum(result[2] for result in results if isinstance(result, tuple) and result[0]) / successful
-            print(f"  Average response time (successful): {avg_response_time:.2f}s")
+    if successful > 0:
+        avg_response_time = total_resp / successful
+        print(f"  Average response time (successful): {avg_response_time:.2f}s")
+        if ttfb_count:
+            print(f"  Average time to first byte (successful): {total_ttfb / ttfb_count:.2f}s")
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+        print(f"  Latency p50/p95/p99: {statistics.median(latencies):.2f}s / {p95:.2f}s / {p99:.2f}s")
 
-async def test_health_check(server_url="http://localhost:5100/"):
+async def test_health_check(session, server_url="http://localhost:5100/"):
     """Test the health check endpoint"""
     print("Testing health check endpoint...")
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(server_url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    print(f"Health check: OK - {data}")
-                    return True
-                else:
-                    print(f"Health check: FAILED - Status {response.status}")
-                    return False
+        async with session.get(server_url) as response:
+            if response.status == 200:
+                data = await response.json()
+                print(f"Health check: OK - {data}")
+                return True
+            else:
+                print(f"Health check: FAILED - Status {response.status}")
+                return False
     except Exception as e:
         print(f"Health check: ERROR - {str(e)}")
         return False
 
-async def main():
+async def main(use_cache=False, max_concurrency=4, burstiness=1.0):
     """Main test function"""
     print("Piper TTS Server Concurrent Request Test")
     print("=" * 60)
     
-    # Test health check first
-    if not await test_health_check():
-        print("Server is not responding. Please start the server first.")
-        return
-    
-    print()
-    
-    # Test concurrent requests
-    await test_concurrent_requests(num_requests=3)
+    # Optional memo of successful responses so repeated texts skip the server
+    tts_cache = {} if use_cache else None
     
-    print()
-    print("Testing with more concurrent requests...")
-    await test_concurrent_requests(num_requests=5)
-    
-    print()
-    print("Testing with 10 concurrent requests...")
-    await test_concurrent_requests(num_requests=10)
+    # One session (and its keep-alive connection pool) shared by every batch,
+    # sized so the largest batch never waits on a free connection
+    batch_sizes = [3, 5, 10]
+    pool_size = max(max(batch_sizes), 32)
+    connector = aiohttp.TCPConnector(
+        limit=pool_size,
+        limit_per_host=pool_size,
+        keepalive_timeout=75,
+        use_dns_cache=True,
+        ttl_dns_cache=300,
+        force_close=False,
+        family=socket.AF_INET  # localhost: skip the IPv6/IPv4 happy-eyeballs race
+    )
+    # Audio is never content-encoded, so skip aiohttp's decompression path entirely
+    async with aiohttp.ClientSession(connector=connector,
+                                     timeout=REQUEST_TIMEOUT,
+                                     skip_auto_headers={"Accept-Encoding"},
+                                     auto_decompress=False) as session:
+        # Test health check first
+        if not await test_health_check(session):
+            print("Server is not responding. Please start the server first.")
+            return
+        
+        print()
+        
+        # Warm up connections and the server-side voice with one untimed request
+        print("Warming up with a single untimed request...")
+        warmup_body = json.dumps({"text": TEST_TEXTS[0], "language": "en"}).encode("utf-8")
+        warmup_report = []
+        ok, _, elapsed, _ = await make_request(session, URL(SYNTHESIZE_URL, encoded=True), warmup_body, 0,
+                                               report=warmup_report)
+        if not ok:
+            _, status, _, _, _, err = warmup_report[0]
+            print(f"Warm-up request failed ({status}: {err}); aborting before timed runs.")
+            return
+        print(f"Warm-up completed in {elapsed:.2f}s")
+        
+        print()
+        
+        # Test concurrent requests
+        await test_concurrent_requests(session, num_requests=batch_sizes[0], tts_cache=tts_cache)
+        
+        print()
+        print("Testing with more concurrent requests...")
+        await test_concurrent_requests(session, num_requests=batch_sizes[1], tts_cache=tts_cache)
+        
+        print()
+        print(f"Testing with {batch_sizes[2]} concurrent requests...")
+        await test_concurrent_requests(session, num_requests=batch_sizes[2], tts_cache=tts_cache)
+        
+        # Sweep arrival rates to see how latency grows with load
+        for qps in [1.0, 3.0, 5.0, 7.0]:
+            print()
+            print(f"Testing at {qps:.1f} QPS...")
+            await test_concurrent_requests(session, num_requests=batch_sizes[2], tts_cache=tts_cache,
+                                           qps=qps, burstiness=burstiness, max_concurrency=max_concurrency)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Concurrent request test for the Piper TTS server")
+    parser.add_argument("--cache", action="store_true",
+                        help="reuse results for repeated texts instead of re-requesting them (functional smoke test)")
+    parser.add_argument("--max-concurrency", type=int, default=4,
+                        help="requests allowed in flight during the QPS sweep (default: 4)")
+    parser.add_argument("--burstiness", type=float, default=1.0,
+                        help="gamma shape of arrival gaps in the QPS sweep; 1.0 is Poisson, lower is burstier (default: 1.0)")
+    args = parser.parse_args()
+    if args.max_concurrency < 1 or args.burstiness <= 0:
+        parser.error("--max-concurrency must be >= 1 and --burstiness must be > 0")
+    asyncio.run(main(use_cache=args.cache, max_concurrency=args.max_concurrency, burstiness=args.burstiness))
\ No newline at end of file